@@ -1,17 +1,235 @@
+from datetime import timedelta
+
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList, IS_FACETS_VAR, ORDER_VAR, PAGE_VAR
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+
 from .models import Post, Comment, KarmaTransaction, Like
 
+CURSOR_VAR = 'before'
+
+
+def estimated_row_count(model, using='default'):
+    """
+    Planner statistics row estimate for a whole table (Postgres only).
+    Partitioned tables are never analyzed themselves, so their children are summed.
+    Returns None when no estimate is available, e.g. on SQLite or before ANALYZE.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT parent.relkind, parent.reltuples::bigint,
+                   (SELECT SUM(GREATEST(child.reltuples, 0))::bigint
+                    FROM pg_inherits
+                    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                    WHERE pg_inherits.inhparent = parent.oid)
+            FROM pg_class parent WHERE parent.oid = %s::regclass
+            """,
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    if not row:
+        return None
+    relkind, reltuples, partition_tuples = row
+    estimate = partition_tuples if relkind == 'p' else reltuples
+    if estimate is None or estimate < 0:
+        return None
+    return estimate
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Avoids exact COUNT(*) over ledger-sized tables.
+    Unfiltered lists use the planner estimate; filtered lists count at most `count_cap` rows.
+    Once the count is inexact only the first `offset_page_limit` pages are reachable
+    by number, deeper rows are reached through the keyset links.
+    """
+    count_cap = 10000
+    offset_page_limit = 5
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, using=queryset.db)
+            if estimate is not None and estimate > self.count_cap:
+                return estimate
+        return queryset.order_by()[:self.count_cap].count()
+
+    @property
+    def is_estimate(self):
+        return self.count >= self.count_cap
+
+    def validate_number(self, number):
+        number = super().validate_number(number)
+        if self.is_estimate and number > self.offset_page_limit:
+            raise EmptyPage('Deep pages are only reachable through the Older link')
+        return number
+
+    def get_elided_page_range(self, number=1, **kwargs):
+        if not self.is_estimate:
+            return super().get_elided_page_range(number, **kwargs)
+        return range(1, min(self.num_pages, self.offset_page_limit) + 1)
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Adds `?before=<key>` navigation so deep pages are an index seek
+    instead of a large OFFSET. The key is the last row's values for the
+    admin's `keyset_fields`, comma separated.
+    The cursor only applies to the default newest-first ordering.
+    """
+    def __init__(self, request, *args, **kwargs):
+        self.raw_cursor = request.GET.get(CURSOR_VAR) if ORDER_VAR not in request.GET else None
+        self.cursor = None
+        super().__init__(request, *args, **kwargs)
+        # Built before get_queryset() dropped the cursor from the params
+        self.remove_facet_link = self.get_query_string(remove=[IS_FACETS_VAR])
+        self.add_facet_link = self.get_query_string({IS_FACETS_VAR: True})
+
+    @property
+    def keyset_fields(self):
+        return [self.lookup_opts.get_field(name) for name in self.model_admin.keyset_fields]
+
+    def parse_cursor(self, raw):
+        parts = raw.split(',')
+        if len(parts) != len(self.keyset_fields):
+            raise IncorrectLookupParameters
+        try:
+            values = [field.to_python(part) for field, part in zip(self.keyset_fields, parts)]
+        except ValidationError:
+            raise IncorrectLookupParameters
+        if None in values:
+            raise IncorrectLookupParameters
+        return values
+
+    def cursor_for(self, obj):
+        return ','.join(field.value_to_string(obj) for field in self.keyset_fields)
+
+    def cursor_filter(self, values):
+        """
+        Rows strictly before `values` in (f1, f2, ...) DESC order. The leading
+        `f1 <= v1` lets Postgres prune partitions keyed on f1.
+        """
+        names = [field.name for field in self.keyset_fields]
+        before = Q()
+        for i, name in enumerate(names):
+            ties = {names[j]: values[j] for j in range(i)}
+            before |= Q(**ties, **{f'{name}__lt': values[i]})
+        return Q(**{f'{names[0]}__lte': values[0]}) & before
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_queryset(self, request, exclude_parameters=None):
+        # Filter, search and sort links start over from the newest rows;
+        # only `older_url` carries a cursor, and it sets a fresh one.
+        self.params.pop(CURSOR_VAR, None)
+        self.filter_params.pop(CURSOR_VAR, None)
+        queryset = super().get_queryset(request, exclude_parameters)
+        if self.raw_cursor:
+            self.cursor = self.parse_cursor(self.raw_cursor)
+            queryset = queryset.filter(self.cursor_filter(self.cursor))
+        return queryset
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.newest_url = self.get_query_string(remove=[CURSOR_VAR]) if self.cursor else None
+        self.older_url = None
+
+        # Keyset links only make sense for the default newest-first ordering
+        if ORDER_VAR in self.params:
+            return
+        results = list(self.result_list)
+        if len(results) == self.list_per_page:
+            self.older_url = self.get_query_string(
+                {CURSOR_VAR: self.cursor_for(results[-1])}, remove=[PAGE_VAR]
+            )
+
+
+class CreatedWithinFilter(admin.SimpleListFilter):
+    """
+    Rolling windows expressed as a single `created_at >= X` range,
+    so the filter is served by the created_at index.
+    """
+    title = 'created within'
+    parameter_name = 'created_within'
+    windows = {
+        '1h': timedelta(hours=1),
+        '24h': timedelta(hours=24),
+        '7d': timedelta(days=7),
+        '30d': timedelta(days=30),
+    }
+
+    def lookups(self, request, model_admin):
+        return (
+            ('1h', 'Last hour'),
+            ('24h', 'Last 24 hours'),
+            ('7d', 'Last 7 days'),
+            ('30d', 'Last 30 days'),
+        )
+
+    def queryset(self, request, queryset):
+        window = self.windows.get(self.value())
+        if window is None:
+            return queryset
+        return queryset.filter(created_at__gte=timezone.now() - window)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Base admin for tables that grow without bound: no exact counts,
+    newest-first keyset navigation and raw id widgets for foreign keys.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Newest-first ordering, also the key of the keyset cursor
+    keyset_fields = ('id',)
+    ordering = ('-id',)
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
-    list_display = ('author', 'likes_count', 'created_at')
+class PostAdmin(LargeTableAdmin):
+    list_display = ('id', 'author', 'likes_count', 'created_at')
+    list_select_related = ('author',)
+    list_filter = (CreatedWithinFilter,)
+    raw_id_fields = ('author',)
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
-    list_display = ('author', 'post', 'likes_count', 'created_at')
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('id', 'author', 'post', 'likes_count', 'created_at')
+    # Post.__str__ reads the post author, so join it as well
+    list_select_related = ('author', 'post__author')
+    raw_id_fields = ('author', 'post', 'parent')
 
 @admin.register(KarmaTransaction)
-class KarmaAdmin(admin.ModelAdmin):
-    list_display = ('user', 'amount', 'source_type', 'created_at')
-    list_filter = ('source_type', 'created_at')
+class KarmaAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'amount', 'source_type', 'source_id', 'created_at')
+    list_select_related = ('user',)
+    # Keyed on the partition column so pages of a partitioned ledger skip newer days
+    keyset_fields = ('created_at', 'id')
+    ordering = ('-created_at', '-id')
+    list_filter = (CreatedWithinFilter, 'source_type')
+    # Exact match only, so the search is a unique-index lookup on auth_user
+    search_fields = ('=user__username',)
+    raw_id_fields = ('user',)
 
-admin.site.register(Like)
\ No newline at end of file
+@admin.register(Like)
+class LikeAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'post', 'comment', 'created_at')
+    list_select_related = ('user', 'post__author', 'comment')
+    raw_id_fields = ('user', 'post', 'comment')
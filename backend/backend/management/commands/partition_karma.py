@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from backend import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintain daily partitions of the karma ledger (Postgres only). "
+        "Run daily from cron; use --convert once to partition an existing table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert', action='store_true',
+            help='Partition the existing ledger table, attaching its rows as a single history partition.'
+        )
+        parser.add_argument(
+            '--premake-days', type=int, default=settings.KARMA_PARTITION_PREMAKE_DAYS,
+            help='Number of future daily partitions to keep ready.'
+        )
+        parser.add_argument(
+            '--retention-days', type=int, default=settings.KARMA_RETENTION_DAYS,
+            help='Detach and drop partitions older than this many days (0 keeps everything).'
+        )
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported():
+            self.stdout.write(f"Partitioning requires PostgreSQL, skipping ({connection.vendor}).")
+            return
+
+        with connection.cursor() as cursor:
+            partitioned = partitions.is_partitioned(cursor)
+
+        if options['convert']:
+            if partitioned:
+                raise CommandError('The karma ledger is already partitioned.')
+            partitions.convert(options['premake_days'])
+            self.stdout.write(self.style.SUCCESS('Karma ledger converted to daily partitions.'))
+            return
+
+        if not partitioned:
+            raise CommandError('The karma ledger is not partitioned yet; run with --convert first.')
+
+        created, dropped, failed = partitions.maintain(options['premake_days'], options['retention_days'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(created)} partition(s), dropped {len(dropped)} partition(s).'
+        ))
+        if failed:
+            # Keys are days that could not be created or partition names that could not be dropped
+            for key, error in sorted(failed.items(), key=lambda item: str(item[0])):
+                self.stderr.write(f'Failed on {key}: {error}')
+            raise CommandError(f'{len(failed)} partition step(s) failed; the rest were committed.')
@@ -27,8 +27,12 @@ class KarmaTransaction(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='karma_transactions')
     amount = models.IntegerField()
     source_type = models.CharField(max_length=10, choices=SOURCE_TYPES)
-    source_id = models.CharField(max_length=255) 
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    source_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Covers the leaderboard's range scan + GROUP BY user without touching the table
+        indexes = [models.Index(fields=['created_at', 'user', 'amount'], name='karma_created_user_amount_idx')]
 
 class Like(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -37,11 +41,19 @@ class Like(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = [
-            ('user', 'post'),
-            ('user', 'comment'),
-        ]
+        # Partial, so each index only holds rows of its own target type.
+        # Target-first ordering matches the hasLiked subqueries (post/comment = outer pk).
         constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'user'],
+                condition=models.Q(post__isnull=False),
+                name='like_post_user_uniq'
+            ),
+            models.UniqueConstraint(
+                fields=['comment', 'user'],
+                condition=models.Q(comment__isnull=False),
+                name='like_comment_user_uniq'
+            ),
             models.CheckConstraint(
                 condition=(models.Q(post__isnull=False) & models.Q(comment__isnull=True)) |
                       (models.Q(post__isnull=True) & models.Q(comment__isnull=False)),
@@ -0,0 +1,288 @@
+"""
+Daily range partitioning of the karma ledger (Postgres only).
+
+The ledger is append-only and only ever read by time range, so each UTC day
+lives in its own partition. Old days can then be detached and dropped in O(1)
+instead of being DELETEd row by row.
+
+Every DDL step runs in its own short transaction: creating or dropping a
+partition takes a lock on the whole ledger, and every like writes to it.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import DatabaseError, connection, transaction
+
+from .models import KarmaTransaction
+
+PARENT = KarmaTransaction._meta.db_table
+PREFIX = f'{PARENT}_p'
+HISTORY_PREFIX = f'{PARENT}_before'
+DEFAULT_PARTITION = f'{PARENT}_default'
+
+
+def partition_name(day):
+    return f'{PREFIX}{day:%Y%m%d}'
+
+
+def _bound(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc).isoformat()
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [PARENT])
+    row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def _child_names(cursor):
+    cursor.execute(
+        """
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s
+        """,
+        [PARENT]
+    )
+    return [name for (name,) in cursor.fetchall()]
+
+
+def _dated(names, prefix):
+    return {
+        datetime.strptime(name[len(prefix):], '%Y%m%d').date(): name
+        for name in names if name.startswith(prefix)
+    }
+
+
+def list_partitions(cursor):
+    """Return {day: partition name} for every daily partition attached to the ledger."""
+    return _dated(_child_names(cursor), PREFIX)
+
+
+def list_history_partitions(cursor):
+    """Return {first day after it: partition name} for the pre-conversion history partition(s)."""
+    return _dated(_child_names(cursor), HISTORY_PREFIX)
+
+
+def _has_default_partition(cursor):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [DEFAULT_PARTITION])
+    return cursor.fetchone()[0]
+
+
+def _day_range(day):
+    return _bound(day), _bound(day + timedelta(days=1))
+
+
+def create_partition(cursor, day):
+    """
+    Create the partition for `day`. Rows for that day that already landed in
+    the default partition would make CREATE fail, so the default is detached,
+    the day is created, its rows are moved across and the default reattached.
+    """
+    name = partition_name(day)
+    lower, upper = _day_range(day)
+    stranded = False
+    if _has_default_partition(cursor):
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE created_at >= %s AND created_at < %s)',
+            [lower, upper]
+        )
+        stranded = cursor.fetchone()[0]
+    if stranded:
+        cursor.execute(f'ALTER TABLE "{PARENT}" DETACH PARTITION "{DEFAULT_PARTITION}"')
+    cursor.execute(
+        f'CREATE TABLE "{name}" PARTITION OF "{PARENT}" '
+        f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+    )
+    if stranded:
+        cursor.execute(
+            f'INSERT INTO "{name}" SELECT * FROM "{DEFAULT_PARTITION}" WHERE created_at >= %s AND created_at < %s',
+            [lower, upper]
+        )
+        cursor.execute(
+            f'DELETE FROM "{DEFAULT_PARTITION}" WHERE created_at >= %s AND created_at < %s',
+            [lower, upper]
+        )
+        cursor.execute(f'ALTER TABLE "{PARENT}" ATTACH PARTITION "{DEFAULT_PARTITION}" DEFAULT')
+    return name
+
+
+def create_partitions(cursor, start, end):
+    """Create the daily partitions covering [start, end], skipping existing ones."""
+    created = []
+    existing = list_partitions(cursor)
+    day = start
+    while day <= end:
+        if day not in existing:
+            created.append(create_partition(cursor, day))
+        day += timedelta(days=1)
+    return created
+
+
+def stranded_days(cursor):
+    """Days that have rows in the default partition, i.e. days maintenance missed."""
+    cursor.execute(
+        f"SELECT DISTINCT (created_at AT TIME ZONE 'UTC')::date FROM \"{DEFAULT_PARTITION}\""
+    )
+    return sorted(row[0] for row in cursor.fetchall())
+
+
+def drop_partition(cursor, name):
+    """
+    Detach and drop one partition. DETACH ... CONCURRENTLY does not block
+    ledger writes, but Postgres only allows it from PG14 on, outside a
+    transaction block and while the table has no default partition.
+    Otherwise the detach is a metadata-only step in its own short transaction.
+    """
+    if connection.pg_version >= 140000 and not connection.in_atomic_block and not _has_default_partition(cursor):
+        cursor.execute(f'ALTER TABLE "{PARENT}" DETACH PARTITION "{name}" CONCURRENTLY')
+        cursor.execute(f'DROP TABLE "{name}"')
+        return
+    with transaction.atomic():
+        # Fail fast rather than queue every like behind a long-running query
+        cursor.execute("SET LOCAL lock_timeout = '5s'")
+        cursor.execute(f'ALTER TABLE "{PARENT}" DETACH PARTITION "{name}"')
+        cursor.execute(f'DROP TABLE "{name}"')
+
+
+def drop_partitions_before(cursor, cutoff):
+    """
+    Drop every daily partition for a day before `cutoff`, and the history
+    partition once all of it is older than `cutoff`.
+    Returns (dropped, failed) where `failed` maps partition name -> error message.
+    """
+    expired = [name for day, name in sorted(list_partitions(cursor).items()) if day < cutoff]
+    expired += [name for day, name in sorted(list_history_partitions(cursor).items()) if day <= cutoff]
+    dropped, failed = [], {}
+    for name in expired:
+        try:
+            drop_partition(cursor, name)
+            dropped.append(name)
+        except DatabaseError as e:
+            failed[name] = str(e).strip()
+    return dropped, failed
+
+
+def maintain(premake_days, retention_days, today=None):
+    """
+    Pre-create partitions for the coming days, give days stranded in the
+    default partition (missed runs) their own partition, and, when
+    `retention_days` is positive, drop partitions outside the retention window.
+
+    Each drop and each day is committed on its own, so ledger writes only wait
+    for one short step at a time and one failure does not undo the rest.
+    Returns (created, dropped, failed) where `failed` maps day or partition
+    name -> error message.
+    """
+    today = today or datetime.now(dt_timezone.utc).date()
+    created, dropped, failed = [], [], {}
+
+    with connection.cursor() as cursor:
+        if retention_days > 0:
+            cutoff = today - timedelta(days=retention_days)
+            dropped, failed = drop_partitions_before(cursor, cutoff)
+            if _has_default_partition(cursor):
+                with transaction.atomic():
+                    cursor.execute(f'DELETE FROM "{DEFAULT_PARTITION}" WHERE created_at < %s', [_bound(cutoff)])
+
+        existing = list_partitions(cursor)
+        days = {today + timedelta(days=n) for n in range(premake_days + 1)}
+        if _has_default_partition(cursor):
+            days.update(stranded_days(cursor))
+        # Days covered by the history partition already have a home
+        history_end = max(list_history_partitions(cursor), default=None)
+        for day in sorted(days - set(existing)):
+            if history_end and day < history_end:
+                continue
+            try:
+                with transaction.atomic():
+                    created.append(create_partition(cursor, day))
+            except DatabaseError as e:
+                failed[day] = str(e).strip()
+    return created, dropped, failed
+
+
+def convert(premake_days):
+    """
+    One-off migration path: turn the existing ledger table into a partitioned
+    table without copying it. The current table is attached as a single
+    history partition and daily partitions start after it.
+
+    Everything that has to read the whole table (a unique index and a CHECK
+    constraint that proves the partition bound) is built first without
+    blocking writes. The swap itself only holds an exclusive lock for
+    catalog changes.
+
+    The primary key becomes (id, created_at) because Postgres requires the
+    partition key in every unique constraint; ids keep coming from a sequence.
+    """
+    history_index = f'{PARENT}_id_created_at_uniq'
+    check = f'{PARENT}_history_check'
+    sequence = f'{PARENT}_id_seq'
+    today = datetime.now(dt_timezone.utc).date()
+    # Two days ahead, so rows written while the checks below run still fit the bound
+    split = today + timedelta(days=2)
+    history = f'{HISTORY_PREFIX}{split:%Y%m%d}'
+    user_fk = KarmaTransaction._meta.get_field('user')
+    user_table = user_fk.related_model._meta.db_table
+    # CONCURRENTLY is impossible inside a transaction (e.g. under tests)
+    concurrently = '' if connection.in_atomic_block else ' CONCURRENTLY'
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE UNIQUE INDEX{concurrently} IF NOT EXISTS "{history_index}" ON "{PARENT}" (id, created_at)'
+        )
+        cursor.execute(
+            f'ALTER TABLE "{PARENT}" ADD CONSTRAINT "{check}" '
+            f"CHECK (created_at < '{_bound(split)}') NOT VALID"
+        )
+        # Scans the table under a lock that still allows reads and writes
+        cursor.execute(f'ALTER TABLE "{PARENT}" VALIDATE CONSTRAINT "{check}"')
+
+        with transaction.atomic():
+            cursor.execute(f'LOCK TABLE "{PARENT}" IN ACCESS EXCLUSIVE MODE')
+            cursor.execute(f'SELECT MAX(id) FROM "{PARENT}"')
+            max_id = cursor.fetchone()[0]
+
+            cursor.execute(f'ALTER TABLE "{PARENT}" RENAME TO "{history}"')
+            cursor.execute(f'ALTER TABLE "{history}" ALTER COLUMN id DROP IDENTITY IF EXISTS')
+            # The (id) primary key gives way to (id, created_at), built earlier as history_index
+            cursor.execute(f'ALTER TABLE "{history}" DROP CONSTRAINT "{PARENT}_pkey"')
+            cursor.execute(
+                f'ALTER TABLE "{history}" ADD CONSTRAINT "{history[:58]}_pkey" PRIMARY KEY USING INDEX "{history_index}"'
+            )
+            # Free the index names for the parent; the parent's indexes attach these
+            # existing ones instead of rebuilding them
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [history])
+            for (index,) in cursor.fetchall():
+                if not index.startswith(history):
+                    cursor.execute(f'ALTER INDEX "{index}" RENAME TO "{index[:58]}_hist"')
+
+            cursor.execute(f'CREATE TABLE "{PARENT}" (LIKE "{history}") PARTITION BY RANGE (created_at)')
+            cursor.execute(
+                f'ALTER TABLE "{PARENT}" ATTACH PARTITION "{history}" '
+                f"FOR VALUES FROM (MINVALUE) TO ('{_bound(split)}')"
+            )
+            cursor.execute(f'ALTER TABLE "{history}" DROP CONSTRAINT "{check}"')
+            cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{PARENT}" DEFAULT')
+            create_partitions(cursor, split, max(split, today + timedelta(days=premake_days)))
+
+            cursor.execute(f'ALTER TABLE "{PARENT}" ADD PRIMARY KEY (id, created_at)')
+            cursor.execute(
+                f'ALTER TABLE "{PARENT}" ADD CONSTRAINT "{PARENT}_user_id_fk" '
+                f'FOREIGN KEY ("{user_fk.column}") REFERENCES "{user_table}" ("id") DEFERRABLE INITIALLY DEFERRED'
+            )
+
+            cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS "{sequence}"')
+            cursor.execute(f'ALTER SEQUENCE "{sequence}" OWNED BY "{PARENT}"."id"')
+            cursor.execute('SELECT setval(%s, %s, %s)', [sequence, max_id or 1, max_id is not None])
+            cursor.execute(f'ALTER TABLE "{PARENT}" ALTER COLUMN id SET DEFAULT nextval(\'"{sequence}"\')')
+
+            # Indexes on the parent cascade to every current and future partition
+            with connection.schema_editor(atomic=False) as schema_editor:
+                for sql in schema_editor._model_indexes_sql(KarmaTransaction):
+                    schema_editor.execute(sql)
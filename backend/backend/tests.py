@@ -1,8 +1,18 @@
 from django.test import TestCase
+from django.core.management import call_command
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
 from django.utils import timezone
-from datetime import timedelta
-from .models import KarmaTransaction
+from datetime import date, timedelta
+from io import StringIO
+from urllib.parse import quote
+from unittest import mock, skipUnless
+from . import partitions
+from .admin import EstimatedCountPaginator, KarmaAdmin, estimated_row_count
+from .models import Post, Comment, Like, KarmaTransaction
 from django.urls import reverse
 from rest_framework.test import APIClient
 
@@ -30,4 +40,435 @@ class LeaderboardLogicTest(TestCase):
         
         self.assertTrue(len(data) > 0)
         entry = data[0]
-        self.assertEqual(entry['score'], 80, "Leaderboard included points from >24h ago!")
\ No newline at end of file
+        self.assertEqual(entry['score'], 80, "Leaderboard included points from >24h ago!")
+
+def ledger_cursor(transaction):
+    return f'{transaction.created_at.isoformat()},{transaction.pk}'
+
+
+class LedgerAdminTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_login(self.admin)
+        KarmaTransaction.objects.bulk_create([
+            KarmaTransaction(user=self.admin, amount=1, source_type='POST', source_id=i)
+            for i in range(150)
+        ])
+
+    def test_changelist_keyset_navigation(self):
+        url = reverse('admin:backend_karmatransaction_changelist')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        cl = response.context['cl']
+        self.assertEqual(cl.result_count, 150)
+        self.assertIsNone(cl.full_result_count)
+        last = list(cl.result_list)[-1]
+        self.assertIn('before=', cl.older_url)
+
+        response = self.client.get(url + cl.older_url)
+        cl = response.context['cl']
+        self.assertEqual(cl.cursor, [last.created_at, last.pk])
+        self.assertEqual(len(cl.result_list), 50)
+        self.assertTrue(all((t.created_at, t.pk) < (last.created_at, last.pk) for t in cl.result_list))
+        self.assertIsNone(cl.older_url)
+
+    def test_malformed_cursor_is_rejected(self):
+        url = reverse('admin:backend_karmatransaction_changelist')
+        for cursor in ('10', 'yesterday,10', f'{timezone.now().isoformat()},x'):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(url, {'before': cursor})
+                self.assertRedirects(response, url + '?e=1', fetch_redirect_response=False)
+
+    def test_estimated_count_hides_deep_page_links(self):
+        url = reverse('admin:backend_karmatransaction_changelist')
+        with mock.patch.object(EstimatedCountPaginator, 'count_cap', 50), \
+                mock.patch.object(EstimatedCountPaginator, 'offset_page_limit', 2), \
+                mock.patch.object(KarmaAdmin, 'list_per_page', 10):
+            response = self.client.get(url)
+            self.assertTrue(response.context['cl'].paginator.is_estimate)
+            self.assertContains(response, '?p=2')
+            self.assertNotContains(response, '?p=3')
+            self.assertContains(response, 'before=')
+
+            response = self.client.get(url, {'p': 3})
+            self.assertRedirects(response, url + '?e=1', fetch_redirect_response=False)
+
+    def test_explicit_ordering_ignores_cursor(self):
+        url = reverse('admin:backend_karmatransaction_changelist')
+        cursor = ledger_cursor(KarmaTransaction.objects.order_by('-created_at', '-id')[10])
+        response = self.client.get(url, {'before': cursor, 'o': '-2'})
+        cl = response.context['cl']
+        self.assertIsNone(cl.cursor)
+        self.assertEqual(cl.result_count, 150)
+
+        response = self.client.get(url, {'before': cursor})
+        self.assertEqual(len(response.context['cl'].result_list), 100)
+        self.assertNotContains(response, '&amp;o=')
+
+    def test_filter_and_search_links_drop_cursor(self):
+        url = reverse('admin:backend_karmatransaction_changelist')
+        cursor = ledger_cursor(KarmaTransaction.objects.order_by('-created_at', '-id')[60])
+        response = self.client.get(url, {'before': cursor, 'source_type__exact': 'POST'})
+        self.assertEqual(len(response.context['cl'].result_list), 89)
+
+        content = response.content.decode()
+        self.assertIn('created_within=1h', content)
+        self.assertNotIn(f'before={quote(cursor)}', content)
+        self.assertNotIn('name="before"', content)  # search form hidden inputs
+
+        response = self.client.get(url, {'before': cursor, 'q': 'admin'})
+        self.assertNotIn(f'before={quote(cursor)}', response.content.decode())
+
+    def assertChangelistQueries(self, model):
+        # Session, user, capped count and one joined page query
+        # (plus the planner estimate lookup on Postgres)
+        budget = 5 if connection.vendor == 'postgresql' else 4
+        url = reverse(f'admin:backend_{model._meta.model_name}_changelist')
+        with self.assertNumQueries(budget):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_changelist_foreign_keys_are_joined(self):
+        authors = [User.objects.create_user(username=f'author{i}', password='password') for i in range(3)]
+        seed_feed(authors, 5, 3)
+        for model in (Post, Comment, KarmaTransaction, Like):
+            with self.subTest(model=model.__name__):
+                self.assertChangelistQueries(model)
+
+
+def seed_feed(authors, posts, comments_per_post):
+    """
+    Bulk-create a feed: posts spread over `authors`, threaded comments,
+    likes on every post and comment, and the matching karma ledger rows.
+    """
+    new_posts = Post.objects.bulk_create([
+        Post(author=authors[i % len(authors)], content=f'post {i}') for i in range(posts)
+    ])
+    comments = []
+    for post in new_posts:
+        parent = Comment.objects.create(post=post, author=authors[0], content='root')
+        comments.append(parent)
+        comments += Comment.objects.bulk_create([
+            Comment(post=post, author=authors[j % len(authors)], parent=parent, content=f'reply {j}')
+            for j in range(comments_per_post - 1)
+        ])
+    liker = authors[-1]
+    Like.objects.bulk_create(
+        [Like(user=liker, post=post) for post in new_posts] +
+        [Like(user=liker, comment=comment) for comment in comments]
+    )
+    KarmaTransaction.objects.bulk_create(
+        [KarmaTransaction(user=p.author, amount=5, source_type='POST', source_id=p.id) for p in new_posts] +
+        [KarmaTransaction(user=c.author, amount=1, source_type='COMMENT', source_id=c.id) for c in comments]
+    )
+    return new_posts, comments
+
+
+class QueryBudgetTest(TestCase):
+    """
+    Every endpoint must run a fixed number of queries regardless of how
+    many posts, comments and likes exist. A serializer field that lazily
+    touches a relation shows up here as a budget overrun.
+    """
+    SIZES = ((1, 1), (5, 4), (20, 10))
+
+    def setUp(self):
+        cache.clear()  # throttle counters live in the cache
+        self.authors = [User.objects.create_user(username=f'author{i}', password='password') for i in range(3)]
+        self.viewer = User.objects.create_user(username='viewer', password='password')
+        self.client = APIClient()
+
+    def assertBudget(self, budget, method, url, **kwargs):
+        with self.assertNumQueries(budget):
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400, response.content)
+        return response
+
+    def assertCommentCounts(self, response):
+        expected = dict(Post.objects.annotate(n=Count('comments')).values_list('id', 'n'))
+        self.assertEqual({post['id']: post['commentCount'] for post in response.json()}, expected)
+
+    def test_feed_list_is_constant(self):
+        Post.objects.create(author=self.authors[0], content='no comments yet')
+        for posts, comments in self.SIZES:
+            with self.subTest(posts=posts, comments=comments):
+                seed_feed(self.authors, posts, comments)
+                self.client.force_authenticate(user=None)
+                self.assertBudget(2, 'get', reverse('post-list'))
+                self.client.force_authenticate(user=self.viewer)
+                response = self.assertBudget(2, 'get', reverse('post-list'))
+                self.assertCommentCounts(response)
+                self.assertIn(0, [post['commentCount'] for post in response.json()])
+
+    def test_feed_search_and_ordering_are_constant(self):
+        self.client.force_authenticate(user=self.viewer)
+        for posts, comments in self.SIZES:
+            with self.subTest(posts=posts, comments=comments):
+                seed_feed(self.authors, posts, comments)
+                self.assertBudget(2, 'get', reverse('post-list'), data={'search': 'post', 'ordering': '-likes_count'})
+
+    def test_post_detail_is_constant(self):
+        self.client.force_authenticate(user=self.viewer)
+        for posts, comments in self.SIZES:
+            with self.subTest(posts=posts, comments=comments):
+                new_posts, _ = seed_feed(self.authors, posts, comments)
+                self.assertBudget(2, 'get', reverse('post-detail', args=[new_posts[-1].id]))
+
+    def test_leaderboard_is_constant(self):
+        for posts, comments in self.SIZES:
+            with self.subTest(posts=posts, comments=comments):
+                seed_feed(self.authors, posts, comments)
+                self.assertBudget(1, 'get', reverse('leaderboard'))
+
+    def test_like_toggle_is_constant(self):
+        self.client.force_authenticate(user=self.viewer)
+        for posts, comments in self.SIZES:
+            with self.subTest(posts=posts, comments=comments):
+                new_posts, new_comments = seed_feed(self.authors, posts, comments)
+                # Savepoint pair, target, existing like, like write, counter, ledger row, refresh
+                self.assertBudget(8, 'post', reverse('post-like', args=[new_posts[-1].id]))
+                self.assertBudget(8, 'post', reverse('post-like', args=[new_posts[-1].id]))
+                self.assertBudget(8, 'post', reverse('comment-like', args=[new_comments[-1].id]))
+
+    def test_comment_create_is_constant(self):
+        self.client.force_authenticate(user=self.viewer)
+        for posts, comments in self.SIZES:
+            with self.subTest(posts=posts, comments=comments):
+                new_posts, new_comments = seed_feed(self.authors, posts, comments)
+                payload = {'postId': new_posts[-1].id, 'parentId': new_comments[-1].id, 'content': 'hi'}
+                self.assertBudget(3, 'post', reverse('comment-list'), data=payload, format='json')
+
+
+class QueryPlanTest(TestCase):
+    """
+    Runs EXPLAIN (Postgres) / EXPLAIN QUERY PLAN (SQLite) over the SQL an
+    endpoint actually issues and fails on any full table scan.
+    """
+    def setUp(self):
+        cache.clear()
+        self.authors = [User.objects.create_user(username=f'author{i}', password='password') for i in range(3)]
+        self.viewer = User.objects.create_user(username='viewer', password='password')
+        self.posts, self.comments = seed_feed(self.authors, 30, 5)
+        # Like production, the leaderboard window is a thin slice of the ledger
+        recent = KarmaTransaction.objects.order_by('-id').values_list('id', flat=True)[:10]
+        KarmaTransaction.objects.exclude(id__in=list(recent)).update(created_at=timezone.now() - timedelta(days=3))
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.viewer)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Tiny test tables always favour a Seq Scan, or a hash/merge join
+                # that reads a whole lookup table such as auth_user. With those
+                # off, a full scan only remains when no index can serve the join.
+                settings = ('enable_seqscan', 'enable_hashjoin', 'enable_mergejoin')
+                for setting in settings:
+                    cursor.execute(f'SET {setting} = off')
+                try:
+                    cursor.execute('EXPLAIN ' + sql)
+                    return [row[0] for row in cursor.fetchall()]
+                finally:
+                    for setting in settings:
+                        cursor.execute(f'RESET {setting}')
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def plan_nodes(self, plan):
+        """
+        Split a plan into (header, details) pairs. SQLite prints one line per
+        table access; Postgres prints a node header followed by its conditions.
+        """
+        if connection.vendor != 'postgresql':
+            return [(line, []) for line in plan]
+        nodes = []
+        for i, line in enumerate(plan):
+            if i == 0 or '->  ' in line:
+                nodes.append((line, []))
+            else:
+                nodes[-1][1].append(line.strip())
+        return nodes
+
+    def is_full_scan(self, header, details):
+        if connection.vendor == 'postgresql':
+            if 'Seq Scan' in header:
+                return True
+            # An index walked end to end without a condition reads the whole table too
+            return ' Scan ' in header and ' using ' in header and not any(
+                d.startswith('Index Cond:') for d in details
+            )
+        # SQLite: SEARCH is a seek, every SCAN reads the whole table or index
+        return header.startswith('SCAN ')
+
+    def full_scans(self, plan, allowed_scans=()):
+        """
+        Return the plan lines that read a whole table. `allowed_scans` holds
+        (table, index) pairs for ordered index walks that a LIMIT cuts short;
+        they only count as bounded while the plan has no separate sort step.
+        """
+        sorts = any('TEMP B-TREE FOR ORDER BY' in line or 'Sort  (' in line for line in plan)
+        scans = []
+        for header, details in self.plan_nodes(plan):
+            if not self.is_full_scan(header, details):
+                continue
+            if not sorts and any(table in header and index in header for table, index in allowed_scans):
+                continue
+            scans.append(header)
+        return scans
+
+    def assertIndexedPlans(self, method, url, allowed_scans=(), **kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400, response.content)
+
+        statements = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith(('SELECT', 'UPDATE', 'DELETE'))]
+        self.assertTrue(statements)
+        plans = []
+        for sql in statements:
+            plan = self.explain(sql)
+            self.assertEqual(self.full_scans(plan, allowed_scans), [], f'Full table scan in:\n{sql}\n' + '\n'.join(plan))
+            plans.append(plan)
+        return plans
+
+    def test_feed_plans(self):
+        # The feed walks the created_at index newest-first and stops after 200 posts
+        self.assertIndexedPlans(
+            'get', reverse('post-list'),
+            allowed_scans=[('backend_post', 'backend_post_created_at')]
+        )
+
+    def test_like_plans(self):
+        self.assertIndexedPlans('post', reverse('post-like', args=[self.posts[0].id]))
+        self.assertIndexedPlans('post', reverse('comment-like', args=[self.comments[0].id]))
+
+    def test_leaderboard_plan(self):
+        [plan] = self.assertIndexedPlans('get', reverse('leaderboard'))
+        table = KarmaTransaction._meta.db_table
+        if connection.vendor == 'postgresql':
+            range_seeks = [
+                header for header, details in self.plan_nodes(plan)
+                if (table in header or 'karma_created_user_amount_idx' in header) and any(
+                    d.startswith('Index Cond:') and 'created_at >=' in d for d in details
+                )
+            ]
+        else:
+            range_seeks = [
+                line for line in plan
+                if line.startswith(f'SEARCH {table} ') and '(created_at>?)' in line
+            ]
+        self.assertTrue(range_seeks, 'Leaderboard does not seek the ledger by created_at:\n' + '\n'.join(plan))
+
+
+class KarmaPartitioningTest(TestCase):
+    def test_partition_names_sort_by_day(self):
+        self.assertEqual(partitions.partition_name(date(2026, 1, 9)), 'backend_karmatransaction_p20260109')
+        self.assertLess(partitions.partition_name(date(2025, 12, 31)), partitions.partition_name(date(2026, 1, 1)))
+
+    def test_command_is_noop_without_postgres(self):
+        if partitions.is_supported():
+            self.skipTest('Only meaningful on non-Postgres backends')
+        out = StringIO()
+        call_command('partition_karma', stdout=out)
+        self.assertIn('requires PostgreSQL', out.getvalue())
+
+    def test_drop_partitions_before_keeps_cutoff_day(self):
+        days = [date(2026, 3, 1), date(2026, 3, 2), date(2026, 3, 3)]
+        daily = {day: partitions.partition_name(day) for day in days}
+        history = {date(2026, 3, 1): 'history_until_0301', date(2026, 3, 3): 'history_until_0303'}
+        with mock.patch.object(partitions, 'list_partitions', return_value=daily), \
+                mock.patch.object(partitions, 'list_history_partitions', return_value=history), \
+                mock.patch.object(partitions, 'drop_partition') as drop:
+            dropped, failed = partitions.drop_partitions_before(mock.Mock(), date(2026, 3, 2))
+        self.assertEqual(dropped, [partitions.partition_name(date(2026, 3, 1)), 'history_until_0301'])
+        self.assertEqual(failed, {})
+        self.assertEqual([c.args[1] for c in drop.call_args_list], dropped)
+
+
+@skipUnless(partitions.is_supported(), 'Karma partitioning requires PostgreSQL')
+class KarmaPartitionMaintenanceTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ledger', password='password')
+        self.today = timezone.now().date()
+        self.split = self.today + timedelta(days=2)
+        for days_ago in (5, 1, 0):
+            t = KarmaTransaction.objects.create(user=self.user, amount=1, source_type='POST', source_id=days_ago)
+            KarmaTransaction.objects.filter(id=t.id).update(created_at=timezone.now() - timedelta(days=days_ago))
+        with connection.cursor() as cursor:
+            # Pending deferred FK checks would block ALTER TABLE in the test transaction
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        self.max_id = KarmaTransaction.objects.order_by('-id').values_list('id', flat=True).first()
+        partitions.convert(premake_days=2)
+
+    def partition_days(self):
+        with connection.cursor() as cursor:
+            return set(partitions.list_partitions(cursor))
+
+    def test_convert_attaches_existing_rows_and_keeps_ids(self):
+        with connection.cursor() as cursor:
+            self.assertTrue(partitions.is_partitioned(cursor))
+            self.assertEqual(list(partitions.list_history_partitions(cursor)), [self.split])
+            history = partitions.list_history_partitions(cursor)[self.split]
+            cursor.execute(f'SELECT COUNT(*) FROM "{history}"')
+            self.assertEqual(cursor.fetchone()[0], 3)
+            # Existing indexes were attached, not rebuilt next to the originals
+            cursor.execute('SELECT indexdef FROM pg_indexes WHERE tablename = %s', [history])
+            defs = [row[0].split(' USING ')[1] for row in cursor.fetchall()]
+            self.assertEqual(len(defs), len(set(defs)), defs)
+            cursor.execute(
+                "SELECT COUNT(*) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", [history]
+            )
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertEqual(self.partition_days(), {self.split})
+        self.assertEqual(KarmaTransaction.objects.count(), 3)
+
+        t = KarmaTransaction.objects.create(user=self.user, amount=1, source_type='POST', source_id=1)
+        self.assertEqual(t.id, self.max_id + 1)
+
+    def test_estimated_row_count_sums_partitions(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE "{partitions.PARENT}"')
+        self.assertEqual(estimated_row_count(KarmaTransaction), 3)
+
+    def test_maintain_creates_ahead_and_drops_before_cutoff(self):
+        today = self.today + timedelta(days=4)
+        created, dropped, failed = partitions.maintain(premake_days=1, retention_days=2, today=today)
+        self.assertEqual(failed, {})
+        self.assertEqual(created, [partitions.partition_name(today + timedelta(days=n)) for n in (0, 1)])
+        # The history partition ends on the cutoff and goes; the cutoff day itself stays
+        self.assertEqual(dropped, [f'{partitions.HISTORY_PREFIX}{self.split:%Y%m%d}'])
+        self.assertEqual(self.partition_days(), {self.split, today, today + timedelta(days=1)})
+        self.assertEqual(KarmaTransaction.objects.count(), 0)
+
+    def test_maintain_rescues_rows_from_default_partition(self):
+        stranded = timezone.now() + timedelta(days=10)
+        t = KarmaTransaction.objects.create(user=self.user, amount=1, source_type='POST', source_id=1)
+        KarmaTransaction.objects.filter(id=t.id).update(created_at=stranded)
+
+        created, _, failed = partitions.maintain(premake_days=2, retention_days=0, today=self.today)
+        self.assertEqual(failed, {})
+        self.assertEqual(created, [partitions.partition_name(stranded.date())])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM "{partitions.DEFAULT_PARTITION}"')
+            self.assertEqual(cursor.fetchone()[0], 0)
+            cursor.execute(f'SELECT COUNT(*) FROM "{partitions.partition_name(stranded.date())}"')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_admin_keyset_pages_skip_newer_partitions(self):
+        admin_user = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_login(admin_user)
+        oldest = KarmaTransaction.objects.order_by('created_at', 'id').first()
+        url = reverse('admin:backend_karmatransaction_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'before': ledger_cursor(oldest)})
+        self.assertEqual(response.status_code, 200)
+
+        page_sql = next(q['sql'] for q in queries if 'ORDER BY' in q['sql'] and partitions.PARENT in q['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {page_sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn(partitions.HISTORY_PREFIX, plan)
+        self.assertNotIn(partitions.PREFIX + f'{self.split:%Y%m%d}', plan)
+        self.assertNotIn(partitions.DEFAULT_PARTITION, plan)
@@ -2,7 +2,8 @@ from rest_framework import viewsets, status, views, permissions, mixins, filters
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.db import transaction, IntegrityError
-from django.db.models import Sum, F, Prefetch, OuterRef, Exists, Count
+from django.db.models import Sum, F, Prefetch, OuterRef, Exists, Count, Subquery
+from django.db.models.functions import Coalesce
 from django.core.cache import cache
 from django.utils import timezone
 from django.middleware.csrf import get_token
@@ -111,13 +112,19 @@ class PostViewSet(LikeMixin, viewsets.ModelViewSet):
             hasLiked=Exists(has_liked_comment)
         )
 
-        # 4. Main Query
+        # 4. Count comments per post in a correlated subquery. A Count() over the
+        # joined comments would GROUP BY every post before the LIMIT applies.
+        comment_count = Comment.objects.filter(
+            post=OuterRef('pk')
+        ).order_by().values('post').annotate(c=Count('pk')).values('c')
+
+        # 5. Main Query
         return Post.objects.select_related('author').prefetch_related(
             Prefetch('comments', queryset=comments_qs),
             # Note: 'comments__author' is handled by select_related in comments_qs
         ).annotate(
             hasLiked=Exists(has_liked_post),
-            comment_count_annotated=Count('comments', distinct=True)
+            comment_count_annotated=Coalesce(Subquery(comment_count), 0)
         )
     
     def list(self, request, *args, **kwargs):
@@ -157,4 +157,7 @@ else:
     SESSION_COOKIE_SAMESITE = 'Lax'
     CSRF_COOKIE_SAMESITE = 'Lax'
     SESSION_COOKIE_SECURE = False
-    CSRF_COOKIE_SECURE = False
\ No newline at end of file
+    CSRF_COOKIE_SECURE = False
+# --- KARMA LEDGER PARTITIONING (Postgres only, see `manage.py partition_karma`) ---
+KARMA_PARTITION_PREMAKE_DAYS = int(os.environ.get('KARMA_PARTITION_PREMAKE_DAYS', '7'))
+KARMA_RETENTION_DAYS = int(os.environ.get('KARMA_RETENTION_DAYS', '0'))  # 0 = keep forever